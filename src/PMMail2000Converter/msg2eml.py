@@ -1,11 +1,14 @@
 import os
 import re
 import shutil
+import hashlib
 import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from tqdm import tqdm
-import extract_msg
-import struct
+from typing import Optional
 
 # --------------------------------------------------------
 # CONFIGURATION
@@ -15,16 +18,60 @@ import struct
 SOURCE_DIR = Path("/Volumes/blueprint Works/Blueprint Software Works/PMMail 2000")
 TARGET_DIR = Path("/Volumes/Convert")
 LOG_FILE = TARGET_DIR / "conversion_log.txt"
+COPY_BUFFER_SIZE = 1 << 20  # 1 MiB – fewer, larger reads/writes on slow volumes
 
 # --------------------------------------------------------
-# INITIALIZE LOGGING
+# PRECOMPILED PATTERNS AND SIGNATURES
 # --------------------------------------------------------
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
+# Signature for OLE2 Compound File Binary Format (a real Outlook .msg)
+_OLE2_SIGNATURE = b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1"
+# Header markers that identify a text-based (RFC 822) mail
+_MAIL_HEADERS = (b"From:", b"Subject:", b"Content-Type:", b"Return-Path:")
+
+_SANITIZE_RE = re.compile(r'[\\/*?:"<>|]')
+_ACCTNAME_RE = re.compile(rb"ACCTNAME\|+([^|]+)")
+# Characters str.isspace() accepts in latin-1 – \s in a bytes pattern is ASCII-only
+_LATIN1_SPACE = rb"\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0"
+_ACCTNAME_FALLBACK_RE = re.compile(
+    rb"ACCTNAME[" + _LATIN1_SPACE + rb"]*([A-Za-z0-9@._\-" + _LATIN1_SPACE + rb"]+)"
 )
+# What str.strip() removes from pure-ASCII text (bytes.strip() misses \x1c-\x1f)
+_ASCII_WHITESPACE = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+_NONPRINT_RE = re.compile(rb"[^\x20-\x7E]")
+_NONASCII_RE = re.compile(r"[^\x00-\x7F]")
+# Folder patterns only ever see printable ASCII (see _NONPRINT_RE)
+_FOLDER_CLASSIC_RE = re.compile(rb"^([\w\s\-]+?)fi\d")
+_FOLDER_NORM_RE = re.compile(rb"^[!]?([A-Za-z\s\-]+?)(?=[0-9;|])")
+_FOLDER_FALLBACK_RE = re.compile(rb"^[!]?([^|;\r\n]+)")
+
+# --------------------------------------------------------
+# INITIALIZE LOGGING
+# --------------------------------------------------------
+
+def start_log_listener(log_queue) -> QueueListener:
+    """Starts the single background thread that writes queued records to LOG_FILE."""
+    file_handler = logging.FileHandler(LOG_FILE)
+    file_handler.setFormatter(logging.Formatter(
+        "%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    ))
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    return listener
+
+
+def init_logging(log_queue):
+    """Routes this process's logging into log_queue."""
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(logging.INFO)
+
+
+def init_worker(log_queue, eml_index):
+    """Pool initializer: queue-based logging plus the shared index of converted MSGs."""
+    global _eml_index
+    init_logging(log_queue)
+    _eml_index = eml_index
 
 # --------------------------------------------------------
 # HELPER FUNCTIONS
@@ -32,7 +79,28 @@ logging.basicConfig(
 
 def sanitize_name(name: str) -> str:
     """Removes invalid filesystem characters and trims whitespace."""
-    return re.sub(r'[\\/*?:"<>|]', "_", name.strip())
+    return _SANITIZE_RE.sub("_", name.strip())
+
+
+@lru_cache(maxsize=4096)
+def _parse_acct_name(raw: bytes) -> Optional[str]:
+    """Extracts the account name from ACCT.INI bytes, None if not found."""
+    # Replace all null bytes with delimiters; only the match gets decoded
+    data = raw.replace(b"\x00", b"|")
+
+    # Look for ACCTNAME and its following block
+    m = _ACCTNAME_RE.search(data)
+    if m:
+        name = m.group(1).decode("latin1").strip()
+        if name:
+            return sanitize_name(name)
+
+    # Fallback: sometimes ACCTNAME appears without delimiters
+    m = _ACCTNAME_FALLBACK_RE.search(data)
+    if m:
+        return sanitize_name(m.group(1).decode("latin1").strip())
+
+    return None
 
 
 def read_acct_name(act_dir: Path) -> str:
@@ -42,21 +110,9 @@ def read_acct_name(act_dir: Path) -> str:
         return sanitize_name(act_dir.stem)
 
     try:
-        raw = ini_file.read_bytes()
-        # Replace all null bytes with delimiters
-        text = raw.replace(b"\x00", b"|").decode("latin1", errors="ignore")
-
-        # Look for ACCTNAME and its following block
-        m = re.search(r"ACCTNAME\|+([^|]+)", text)
-        if m:
-            name = m.group(1).strip()
-            if name:
-                return sanitize_name(name)
-
-        # Fallback: sometimes ACCTNAME appears without delimiters
-        m = re.search(r"ACCTNAME\s*([A-Za-z0-9@._\-\s]+)", text)
-        if m:
-            return sanitize_name(m.group(1).strip())
+        name = _parse_acct_name(ini_file.read_bytes())
+        if name is not None:
+            return name
 
     except Exception as e:
         logging.error(f"Error reading {ini_file}: {e}", exc_info=True)
@@ -65,6 +121,38 @@ def read_acct_name(act_dir: Path) -> str:
     return sanitize_name(act_dir.stem)
 
 
+@lru_cache(maxsize=4096)
+def _parse_folder_name(raw: bytes) -> Optional[str]:
+    """Extracts the folder name from FOLDER.INI bytes, None if not found."""
+    data = raw.replace(b"\x00", b"")
+    if data.isascii():
+        data = data.strip(_ASCII_WHITESPACE)
+    else:
+        # Rare case: decode so undecodable bytes vanish, Unicode whitespace is
+        # stripped and each remaining character becomes one delimiter
+        data = _NONASCII_RE.sub("|", data.decode(errors="ignore").strip()).encode("ascii")
+
+    # Replace non-printable characters
+    cleaned = _NONPRINT_RE.sub(b"|", data)
+
+    # 1️⃣ Classic format ("Inboxfi1")
+    match = _FOLDER_CLASSIC_RE.search(cleaned)
+    if match:
+        return sanitize_name(match.group(1).decode("ascii"))
+
+    # 2️⃣ Normalized or broken encoding variants – everything until a number or semicolon
+    match = _FOLDER_NORM_RE.search(cleaned)
+    if match:
+        return sanitize_name(match.group(1).decode("ascii"))
+
+    # 3️⃣ Fallback – first segment before a delimiter
+    match = _FOLDER_FALLBACK_RE.search(cleaned)
+    if match:
+        return sanitize_name(match.group(1).decode("ascii"))
+
+    return None
+
+
 def read_folder_name(fld_dir: Path) -> str:
     """Extracts folder names from FOLDER.INI – robust against encoding issues."""
     ini_file = fld_dir / "FOLDER.INI"
@@ -73,26 +161,10 @@ def read_folder_name(fld_dir: Path) -> str:
         return sanitize_name(fld_dir.stem)
 
     try:
-        raw = ini_file.read_bytes()
-        text = raw.replace(b"\x00", b"").decode(errors="ignore").strip()
-
-        # Replace non-printable characters
-        cleaned = re.sub(r"[^\x20-\x7E]", "|", text)
-
-        # 1️⃣ Classic format ("Inboxfi1")
-        match = re.search(r"^([\wÄÖÜäöüß\s\-]+?)(?:fi|\ufb01)\d", cleaned)
-        if match:
-            return sanitize_name(match.group(1))
-
-        # 2️⃣ Normalized or broken encoding variants – everything until a number or semicolon
-        match = re.search(r"^[!]?([A-Za-zÄÖÜäöüß\s\-]+?)(?=[0-9;|])", cleaned)
-        if match:
-            return sanitize_name(match.group(1))
-
-        # 3️⃣ Fallback – first segment before a delimiter
-        match = re.search(r"^[!]?([^|;\r\n]+)", cleaned)
-        if match:
-            return sanitize_name(match.group(1))
+        # Identical payloads (default Inbox/Outbox/...) are parsed only once
+        name = _parse_folder_name(ini_file.read_bytes())
+        if name is not None:
+            return name
 
         logging.warning(f"No valid folder name found in {ini_file}")
 
@@ -102,51 +174,186 @@ def read_folder_name(fld_dir: Path) -> str:
     return sanitize_name(fld_dir.stem)
 
 
-def build_path_map(root: Path):
-    """Builds a mapping {folder_without_suffix: readable_name} for .ACT/.FLD."""
+def scan_archive(root: Path):
+    """Walks the archive once, collecting .ACT/.FLD directories and .msg files."""
+    act_dirs, fld_dirs, msg_files = [], [], []
+
+    # Explicit stack instead of recursion – no depth limit on deep archives
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            # Like rglob: an unreadable directory is skipped, not fatal
+            logging.warning(f"Skipping unreadable directory {directory}: {e}")
+            continue
+
+        with entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError as e:
+                    logging.warning(f"Skipping {entry.path}: {e}")
+                    continue
+
+                if is_dir:
+                    if entry.name.endswith(".ACT"):
+                        act_dirs.append(Path(entry.path))
+                    elif entry.name.endswith(".FLD"):
+                        fld_dirs.append(Path(entry.path))
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(".msg"):
+                    msg_files.append(Path(entry.path))
+
+    return act_dirs, fld_dirs, msg_files
+
+
+def build_path_map(act_dirs, fld_dirs):
+    """Builds a mapping {folder_path: readable_name} for .ACT/.FLD."""
     name_map = {}
-    for act in root.rglob("*.ACT"):
-        name_map[act.with_suffix("")] = read_acct_name(act)
-    for fld in root.rglob("*.FLD"):
-        name_map[fld.with_suffix("")] = read_folder_name(fld)
+    for act in act_dirs:
+        name_map[act] = read_acct_name(act)
+    for fld in fld_dirs:
+        name_map[fld] = read_folder_name(fld)
     return name_map
 
 
-def is_ole2_file(path: Path) -> bool:
-    """Checks if the file has an OLE2 structure (a real Outlook .msg)."""
-    try:
-        with open(path, "rb") as f:
-            header = f.read(8)
-        # Signature for OLE2 Compound File Binary Format
-        return header == b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1"
-    except Exception:
-        return False
-
-
-def convert_msg_to_eml(msg_path: Path, eml_path: Path):
+def build_name_trie(root: Path, name_map) -> dict:
+    """Arranges name_map as a prefix tree of path components below root.
+
+    Each node maps a component to its child node; the readable name of a
+    mapped folder is stored in its node under the key None.
+    """
+    trie = {}
+    for path, name in name_map.items():
+        node = trie
+        for part in path.relative_to(root).parts:
+            node = node.setdefault(part, {})
+        node[None] = name
+    return trie
+
+
+def resolve_eml_path(msg_file: Path, name_trie: dict) -> Path:
+    """Maps a .msg below SOURCE_DIR to its .eml below TARGET_DIR, with readable folder names."""
+    parts = list(msg_file.relative_to(SOURCE_DIR).parts)
+
+    # Descend the trie along the folder parts; stop once no mapped folder lies below.
+    # The file name itself is never renamed.
+    node = name_trie
+    for i in range(len(parts) - 1):
+        node = node.get(parts[i])
+        if node is None:
+            break
+        name = node.get(None)
+        if name is not None:
+            parts[i] = name
+
+    return TARGET_DIR / Path(*parts).with_suffix(".eml")
+
+
+def unique_eml_path(eml_path: Path, taken: set) -> Path:
+    """Returns eml_path, or a numbered variant of it, not yet in taken, and claims it.
+
+    Paths are compared case-insensitively, since the target volume may be.
+    """
+    candidate, n = eml_path, 1
+    while str(candidate).casefold() in taken:
+        n += 1
+        candidate = eml_path.with_name(f"{eml_path.stem}_{n}{eml_path.suffix}")
+    taken.add(str(candidate).casefold())
+    return candidate
+
+
+def is_text_mail(head: bytes) -> bool:
+    """Checks the leading bytes of a file for typical mail headers."""
+    # Plain loop: returns on the first hit without building a generator
+    for header in _MAIL_HEADERS:
+        if header in head:
+            return True
+    return False
+
+
+def copy_file(src, dst):
+    """Copies the whole of src into dst, in-kernel via os.sendfile where supported."""
+    size = os.fstat(src.fileno()).st_size
+    offset = 0
+    if hasattr(os, "sendfile"):
+        try:
+            while offset < size:
+                sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            return
+        except OSError:
+            # e.g. macOS, where sendfile() only writes to sockets
+            pass
+
+    src.seek(offset)
+    dst.seek(offset)
+    shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+
+
+# Content hash of an Outlook MSG -> path of its finished .eml; replaced by a
+# Manager dict shared across the pool in main()
+_eml_index = {}
+_message_class = None  # extract_msg.Message, imported on first OLE2 file
+
+
+def write_ole2_as_eml(raw: bytes, eml_path: Path):
+    """Converts an Outlook MSG to eml_path, copying an earlier result for identical files."""
+    key = hashlib.blake2b(raw, digest_size=16).digest()
+    done_path = _eml_index.get(key)
+    if done_path is not None:
+        try:
+            with open(done_path, "rb", buffering=0) as src, \
+                    open(eml_path, "wb", buffering=COPY_BUFFER_SIZE) as dst:
+                copy_file(src, dst)
+            return
+        except OSError as e:
+            logging.warning(f"Could not reuse {done_path} for {eml_path}, converting again: {e}")
+
+    global _message_class
+    if _message_class is None:
+        # extract_msg is heavy; only load it once an Outlook MSG actually shows up
+        from extract_msg import Message
+        _message_class = Message
+
+    # extract_msg parses the bytes already in memory instead of reopening the file
+    eml_bytes = _message_class(raw).asEmailMessage().as_bytes()
+    with open(eml_path, "wb", buffering=COPY_BUFFER_SIZE) as f:
+        f.write(eml_bytes)
+
+    # Published only once the file is complete, so other workers can copy it
+    _eml_index[key] = str(eml_path)
+
+
+def convert_msg_to_eml(msg_path: Path, eml_path: Path) -> bool:
     """Converts real Outlook MSG files or copies text-based emails."""
     try:
-        # First, check if it's a genuine Outlook MSG file
-        if is_ole2_file(msg_path):
-            msg = extract_msg.Message(str(msg_path))
-            eml_bytes = msg.as_bytes()
-            with open(eml_path, "wb") as f:
-                f.write(eml_bytes)
-            #logging.info(f"CONVERTED (Outlook MSG): {msg_path}")
-            return True
-
-        # Otherwise, check if it’s a text-based EML file
-        with open(msg_path, "rb") as f:
-            data = f.read(4096)
+        # One read serves both the OLE2 signature and the text-mail sniff
+        with open(msg_path, "rb", buffering=0) as src:
+            head = src.read(4096)
+
+            # startswith() on the buffer rejects non-OLE2 files at the first differing byte
+            if head.startswith(_OLE2_SIGNATURE):
+                write_ole2_as_eml(head + src.readall(), eml_path)
+                #logging.info(f"CONVERTED (Outlook MSG): {msg_path}")
+                return True
+
+            # Otherwise, check if it’s a text-based EML file
+            if is_text_mail(head):
+                # Copy the raw bytes as-is, no decode/encode round-trip
+                with open(eml_path, "wb", buffering=COPY_BUFFER_SIZE) as dst:
+                    copy_file(src, dst)
+                #logging.info(f"COPIED (Text mail): {msg_path}")
+                return True
+
+            # Fallback: PMMail binary format – at least save raw content (all of it)
+            with open(eml_path, "wb", buffering=COPY_BUFFER_SIZE) as dst:
+                copy_file(src, dst)
 
-        text = data.decode("utf-8", errors="ignore")
-        if any(h in text for h in ("From:", "Subject:", "Content-Type:", "Return-Path:")):
-            eml_path.write_text(text, encoding="utf-8", errors="ignore")
-            #logging.info(f"COPIED (Text mail): {msg_path}")
-            return True
-
-        # Fallback: PMMail binary format – at least save raw content
-        eml_path.write_bytes(data)
         logging.warning(f"UNCLEAR (Binary format, copied without conversion): {msg_path}")
         return True
 
@@ -160,44 +367,72 @@ def convert_msg_to_eml(msg_path: Path, eml_path: Path):
 # --------------------------------------------------------
 
 def main():
+    # Imported here so spawned workers, which re-import this module, skip it
+    from tqdm import tqdm
+
     if not SOURCE_DIR.exists():
         print("Source directory does not exist.")
         return
 
     TARGET_DIR.mkdir(parents=True, exist_ok=True)
-    logging.info("Starting conversion...")
-
-    # Build name mapping for all .ACT and .FLD directories
-    name_map = build_path_map(SOURCE_DIR)
-
-    # Collect all .msg files recursively
-    msg_files = [p for p in SOURCE_DIR.rglob("*") if p.suffix.lower() == ".msg"]
-    if not msg_files:
-        print("No .msg files found.")
-        return
 
-    ok_count, err_count = 0, 0
-
-    for msg_file in tqdm(msg_files, desc="Converting .MSG files", unit="file"):
-        rel_path = msg_file.relative_to(SOURCE_DIR)
-        parts = list(rel_path.parts)
-
-        for i in range(len(parts)):
-            abs_path = SOURCE_DIR.joinpath(*rel_path.parts[:i + 1])
-            if abs_path.with_suffix("") in name_map:
-                parts[i] = name_map[abs_path.with_suffix("")]
-
-        eml_rel = Path(*parts).with_suffix(".eml")
-        eml_path = TARGET_DIR / eml_rel
-        eml_path.parent.mkdir(parents=True, exist_ok=True)
-
-        if convert_msg_to_eml(msg_file, eml_path):
-            ok_count += 1
-        else:
-            err_count += 1
+    # Workers only enqueue records; one listener thread does the file I/O
+    log_queue = multiprocessing.Queue(-1)
+    listener = start_log_listener(log_queue)
+    init_logging(log_queue)
+    try:
+        logging.info("Starting conversion...")
+
+        # Collect .ACT/.FLD directories and .msg files in a single pass
+        act_dirs, fld_dirs, msg_files = scan_archive(SOURCE_DIR)
+
+        # Build name mapping for all .ACT and .FLD directories
+        name_trie = build_name_trie(SOURCE_DIR, build_path_map(act_dirs, fld_dirs))
+
+        if not msg_files:
+            print("No .msg files found.")
+            return
+
+        # Resolve target paths up front, then convert in parallel
+        eml_paths = []
+        taken = set()
+        for msg_file in msg_files:
+            eml_path = resolve_eml_path(msg_file, name_trie)
+
+            # Folders mapped to the same readable name can collide; two workers
+            # must never write the same file
+            unique_path = unique_eml_path(eml_path, taken)
+            if unique_path != eml_path:
+                logging.warning(f"DUPLICATE target {eml_path} for {msg_file}, writing {unique_path}")
+                eml_path = unique_path
+
+            eml_path.parent.mkdir(parents=True, exist_ok=True)
+            eml_paths.append(eml_path)
+
+        ok_count = 0
+
+        # extract_msg is pure Python, so only processes give real parallelism
+        # Only this process updates the bar: redraw in batches and never block on the lock
+        # Workers share only digest -> finished .eml path, so duplicates are parsed once pool-wide
+        with multiprocessing.Manager() as manager, \
+                ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=init_worker,
+                                    initargs=(log_queue, manager.dict())) as executor, \
+                tqdm(total=len(msg_files), desc="Converting .MSG files", unit="file",
+                     mininterval=0.25, miniters=64, smoothing=0, lock_args=(False,)) as pbar:
+            # Batches of 32 files per task amortize the pickling round-trip to the workers.
+            # map() yields results in submission order, so the bar follows the oldest
+            # chunk and can pause behind a slow file while later chunks already run.
+            for ok in executor.map(convert_msg_to_eml, msg_files, eml_paths, chunksize=32):
+                ok_count += ok
+                pbar.update(1)
+
+        err_count = len(msg_files) - ok_count
+
+        print(f"\nDone. Successful: {ok_count}, Errors: {err_count}. Log: {LOG_FILE}")
+        logging.info(f"Done. Successful: {ok_count}, Errors: {err_count}")
+    finally:
+        listener.stop()
 
-    print(f"\nDone. Successful: {ok_count}, Errors: {err_count}. Log: {LOG_FILE}")
-    logging.info(f"Done. Successful: {ok_count}, Errors: {err_count}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,252 @@
+import os
+import random
+import re
+import sys
+import tempfile
+import unittest
+from email.message import EmailMessage
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from PMMail2000Converter import msg2eml  # noqa: E402
+
+
+# --------------------------------------------------------
+# REFERENCE: the original str-based INI parsers
+# --------------------------------------------------------
+
+def ref_sanitize_name(name):
+    return re.sub(r'[\\/*?:"<>|]', "_", name.strip())
+
+
+def ref_parse_acct_name(raw):
+    text = raw.replace(b"\x00", b"|").decode("latin1", errors="ignore")
+    m = re.search(r"ACCTNAME\|+([^|]+)", text)
+    if m:
+        name = m.group(1).strip()
+        if name:
+            return ref_sanitize_name(name)
+    m = re.search(r"ACCTNAME\s*([A-Za-z0-9@._\-\s]+)", text)
+    if m:
+        return ref_sanitize_name(m.group(1).strip())
+    return None
+
+
+def ref_parse_folder_name(raw):
+    text = raw.replace(b"\x00", b"").decode(errors="ignore").strip()
+    cleaned = re.sub(r"[^\x20-\x7E]", "|", text)
+    for pattern in (r"^([\wÄÖÜäöüß\s\-]+?)(?:fi|\ufb01)\d",
+                    r"^[!]?([A-Za-zÄÖÜäöüß\s\-]+?)(?=[0-9;|])",
+                    r"^[!]?([^|;\r\n]+)"):
+        match = re.search(pattern, cleaned)
+        if match:
+            return ref_sanitize_name(match.group(1))
+    return None
+
+
+# Fragments that exercise delimiters, latin-1/UTF-8 text and Unicode whitespace
+FRAGMENTS = [
+    b"ACCTNAME", b"Inbox", b"Drafts", b"John", b"fi", b"\xef\xac\x81", b"1", b";", b"|",
+    b"\x00", b" ", b"\t", b"\r\n", b"\x1f", b"\x85", b"\xa0", b"\xc2\xa0", b"\xe2\x80\x83",
+    b"\xe4", b"\xf6", b"\xff", b"-", b"!", b"@", b".",
+]
+
+
+class ParseIniTests(unittest.TestCase):
+
+    def test_folder_names(self):
+        cases = {
+            b"Inboxfi1;x": "Inbox",
+            b"!Sent Items\x00\x001;2": "Sent Items",
+            b"\x1fInbox;1": "Inbox",
+            b"\xc2\xa0Inbox;1": "Inbox",
+            b"\xe2\x80\x83Drafts;2": "Drafts",
+            b"Gel\xf6scht;1": "Gelscht",
+        }
+        for raw, expected in cases.items():
+            self.assertEqual(msg2eml._parse_folder_name(raw), expected, raw)
+
+    def test_acct_names(self):
+        cases = {
+            b"foo\x00ACCTNAME\x00\x00John Doe\x00bar": "John Doe",
+            b"ACCTNAME\x1fJohn Doe": "John Doe",
+            b"ACCTNAME\xa0me@example.org\x01": "me@example.org",
+            b"nothing here": None,
+        }
+        for raw, expected in cases.items():
+            self.assertEqual(msg2eml._parse_acct_name(raw), expected, raw)
+
+    def test_matches_str_based_parser(self):
+        rnd = random.Random(0)
+        for _ in range(5000):
+            raw = b"".join(
+                rnd.choice(FRAGMENTS) if rnd.random() < 0.8 else bytes([rnd.randrange(256)])
+                for _ in range(rnd.randrange(12))
+            )
+            self.assertEqual(msg2eml._parse_folder_name(raw), ref_parse_folder_name(raw), raw)
+            self.assertEqual(msg2eml._parse_acct_name(raw), ref_parse_acct_name(raw), raw)
+
+
+class ScanArchiveTests(unittest.TestCase):
+
+    def test_unreadable_directory_is_skipped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "A.ACT" / "IN.FLD").mkdir(parents=True)
+            (root / "locked").mkdir()
+            (root / "A.ACT" / "IN.FLD" / "1.msg").touch()
+            (root / "locked" / "2.msg").touch()
+            (root / "3.MSG").touch()
+
+            real_scandir = os.scandir
+
+            def scandir(path):
+                if Path(path).name == "locked":
+                    raise PermissionError(13, "Permission denied", path)
+                return real_scandir(path)
+
+            with mock.patch.object(msg2eml.os, "scandir", scandir), \
+                    self.assertLogs(level="WARNING"):
+                act_dirs, fld_dirs, msg_files = msg2eml.scan_archive(root)
+
+            self.assertEqual(act_dirs, [root / "A.ACT"])
+            self.assertEqual(fld_dirs, [root / "A.ACT" / "IN.FLD"])
+            self.assertEqual(sorted(msg_files), [root / "3.MSG", root / "A.ACT" / "IN.FLD" / "1.msg"])
+
+
+class ResolveEmlPathTests(unittest.TestCase):
+
+    def setUp(self):
+        self.src = Path("/archive")
+        patcher = mock.patch.multiple(msg2eml, SOURCE_DIR=self.src, TARGET_DIR=Path("/out"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.trie = msg2eml.build_name_trie(self.src, {
+            self.src / "A1.ACT": "John Doe",
+            self.src / "A1.ACT" / "IN.FLD": "Inbox",
+            self.src / "A1.ACT" / "IN.FLD" / "SUB.FLD": "Archive",
+            self.src / "misc" / "X.FLD": "Misc",
+        })
+
+    def resolve(self, *parts):
+        return msg2eml.resolve_eml_path(self.src.joinpath(*parts), self.trie)
+
+    def test_nested_folders_are_mapped(self):
+        self.assertEqual(self.resolve("A1.ACT", "IN.FLD", "SUB.FLD", "1.msg"),
+                         Path("/out/John Doe/Inbox/Archive/1.eml"))
+
+    def test_unmapped_folders_are_kept(self):
+        self.assertEqual(self.resolve("misc", "X.FLD", "2.MSG"), Path("/out/misc/Misc/2.eml"))
+        self.assertEqual(self.resolve("A1.ACT", "plain", "IN.FLD", "3.msg"),
+                         Path("/out/John Doe/plain/IN.FLD/3.eml"))
+        self.assertEqual(self.resolve("other", "4.msg"), Path("/out/other/4.eml"))
+
+    def test_file_name_is_never_renamed(self):
+        # X.msg next to X.FLD: the original stem-based lookup renamed it to Misc.eml
+        self.assertEqual(self.resolve("misc", "X.msg"), Path("/out/misc/X.eml"))
+        # Even a last component that is itself a mapped path is left alone
+        self.assertEqual(self.resolve("A1.ACT", "IN.FLD"), Path("/out/John Doe/IN.eml"))
+
+
+class UniqueEmlPathTests(unittest.TestCase):
+
+    def test_collisions_get_numbered_names(self):
+        taken = set()
+        target = Path("/out/Inbox/a.eml")
+        self.assertEqual(msg2eml.unique_eml_path(target, taken), target)
+        self.assertEqual(msg2eml.unique_eml_path(target, taken), Path("/out/Inbox/a_2.eml"))
+        self.assertEqual(msg2eml.unique_eml_path(Path("/out/Inbox/A.eml"), taken),
+                         Path("/out/Inbox/A_3.eml"))
+        self.assertEqual(msg2eml.unique_eml_path(Path("/out/Inbox/b.eml"), taken),
+                         Path("/out/Inbox/b.eml"))
+
+
+class ConvertMsgToEmlTests(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        rnd = random.Random(0)
+        # Both are well past the 4 KiB sniff buffer
+        self.sources = {
+            "binary": bytes(rnd.randrange(1, 256) for _ in range(50000)).replace(b":", b"."),
+            "text": b"From: a@example.org\r\nSubject: hi\r\n\r\n" + b"body line\r\n" * 5000,
+        }
+
+    def convert_all(self):
+        for kind, data in self.sources.items():
+            msg_path = self.dir / f"{kind}.msg"
+            eml_path = self.dir / f"{kind}.eml"
+            msg_path.write_bytes(data)
+            if kind == "binary":
+                with self.assertLogs(level="WARNING"):
+                    self.assertTrue(msg2eml.convert_msg_to_eml(msg_path, eml_path))
+            else:
+                self.assertTrue(msg2eml.convert_msg_to_eml(msg_path, eml_path))
+            self.assertEqual(eml_path.read_bytes(), data, kind)
+
+    @unittest.skipUnless(hasattr(os, "sendfile"), "os.sendfile not available")
+    def test_copies_are_complete_with_sendfile(self):
+        with mock.patch.object(msg2eml.os, "sendfile", wraps=os.sendfile) as sendfile:
+            self.convert_all()
+        self.assertTrue(sendfile.called)
+
+    def test_copies_are_complete_without_sendfile(self):
+        with mock.patch.object(msg2eml.os, "sendfile", side_effect=OSError("not a socket"),
+                               create=True):
+            self.convert_all()
+
+
+class FakeMessage:
+    """Stands in for extract_msg.Message and records every parse."""
+
+    parsed = []
+
+    def __init__(self, raw):
+        self.raw = raw
+        FakeMessage.parsed.append(raw)
+
+    def asEmailMessage(self):
+        message = EmailMessage()
+        message["Subject"] = "fake"
+        message.set_content(self.raw.hex())
+        return message
+
+
+class Ole2IndexTests(unittest.TestCase):
+
+    def setUp(self):
+        FakeMessage.parsed = []
+        patcher = mock.patch.multiple(msg2eml, _message_class=FakeMessage, _eml_index={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out = Path(tmp.name)
+
+    def test_identical_messages_are_parsed_once(self):
+        msg2eml.write_ole2_as_eml(b"same", self.out / "a.eml")
+        msg2eml.write_ole2_as_eml(b"same", self.out / "b.eml")
+        self.assertEqual(FakeMessage.parsed, [b"same"])
+        self.assertEqual((self.out / "a.eml").read_bytes(), (self.out / "b.eml").read_bytes())
+
+    def test_different_messages_are_parsed_separately(self):
+        msg2eml.write_ole2_as_eml(b"one", self.out / "a.eml")
+        msg2eml.write_ole2_as_eml(b"two", self.out / "b.eml")
+        self.assertEqual(FakeMessage.parsed, [b"one", b"two"])
+        self.assertIn(b"74776f", (self.out / "b.eml").read_bytes())
+
+    def test_missing_earlier_output_is_converted_again(self):
+        msg2eml.write_ole2_as_eml(b"same", self.out / "a.eml")
+        (self.out / "a.eml").unlink()
+        with self.assertLogs(level="WARNING"):
+            msg2eml.write_ole2_as_eml(b"same", self.out / "b.eml")
+        self.assertEqual(FakeMessage.parsed, [b"same", b"same"])
+        self.assertTrue((self.out / "b.eml").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()